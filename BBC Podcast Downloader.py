@@ -1,18 +1,104 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox, filedialog
-from threading import Thread
+from threading import Thread, Lock
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import re
-from urllib.parse import urljoin
+import html
+import time
+from urllib.parse import urljoin, urlparse
 import pyperclip
 
+# Prefer the libxml2-backed parser; fall back to the stdlib one if lxml is missing
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+# Keep concurrent requests to the BBC site modest
+MAX_WORKERS = 8
+# Listing pages fetched ahead of the one being parsed
+PAGE_LOOKAHEAD = 2
+# Minimum seconds between starting requests to the same host
+MIN_REQUEST_INTERVAL = 1.5
+
+# Episode page links across the different URL layouts BBC has used
+EPISODE_PATTERN = re.compile(
+    r'/(the-english-we-speak[-_/]20\d{2}[-_/]ep-\d+|'
+    r'features/the-english-we-speak/ep-\d+|'
+    r'features/the-english-we-speak_\d{4}/ep-\d+|'
+    r'6-minute-english_\d{4}/ep-\d+|features/6-minute-english/ep-\d+)', re.IGNORECASE
+)
+EP_NUM = re.compile(r'ep-(\d{6})')
+PDF_HREF = re.compile(r'\.pdf$', re.IGNORECASE)
+MP3_HREF = re.compile(r'\.mp3$', re.IGNORECASE)
+# An <a> tag's quoted href ending in .pdf or .mp3, for scanning raw episode HTML
+MEDIA_HREF = re.compile(r'<a\b[^>]*?\shref=["\']([^"\']+\.(pdf|mp3))["\']', re.IGNORECASE)
+
+
+# Parsing helpers are plain functions of the page so they can run on any worker thread
+
+def parse_episode_links(page_html, base_url):
+    # Absolute episode URLs linked from a listing page, in page order
+    soup = BeautifulSoup(page_html, HTML_PARSER)
+    # Cheap substring prefilter first, then the full pattern on the few survivors
+    candidates = soup.select('a[href*="/ep-" i]')
+    return [urljoin(base_url, link['href']) for link in candidates if EPISODE_PATTERN.search(link['href'])]
+
+
+def parse_media_links(page_html, url):
+    # Find the first PDF and MP3 hrefs in one pass over the raw HTML, without building a DOM
+    pdf_href = audio_href = None
+    for match in MEDIA_HREF.finditer(page_html):
+        if match.group(2).lower() == 'pdf':
+            pdf_href = pdf_href or html.unescape(match.group(1))
+        else:
+            audio_href = audio_href or html.unescape(match.group(1))
+        if pdf_href and audio_href:
+            break
+
+    if not (pdf_href or audio_href):
+        # Nothing found in the raw scan (unusual markup); fall back to a full parse
+        soup = BeautifulSoup(page_html, HTML_PARSER)
+        pdf_link = soup.find('a', href=PDF_HREF)
+        pdf_href = pdf_link['href'] if pdf_link else None
+        audio_link = soup.find('a', href=MP3_HREF)
+        audio_href = audio_link['href'] if audio_link else None
+
+    pdf = urljoin(url, pdf_href) if pdf_href else "N/A"
+    audio = urljoin(url, audio_href) if audio_href else "N/A"
+    return pdf, audio
+
+
 class PodcastScraper:
     def __init__(self, root):
         self.root = root
         self.root.title("BBC Podcast Scraper")
         self.episode_links = []
         self.failed_links = [] 
+
+        # Shared session so repeated requests to bbc.co.uk reuse connections
+        self.session = requests.Session()
+        self.session.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36',
+            'Accept-Language': 'en-US,en;q=0.9'
+        })
+        # Retry rate-limit and server errors with exponential backoff
+        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                      allowed_methods=['GET'], raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=20, pool_maxsize=20, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.throttle_lock = Lock()
+        self.next_request = {}
+
+        # One worker pool for the app's lifetime, shared by both scraping passes
+        self.executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+
         self.create_widgets()
 
     def create_widgets(self):
@@ -76,41 +162,40 @@ class PodcastScraper:
         # Bind to delete selected episode link from the list
         self.episode_tab.bind("<Delete>", self.delete_selected_link)
 
+    # Widgets are read here, on the Tk thread, before handing work to a background thread
+
     def start_scraping_thread(self):
-        Thread(target=self.scrape_episodes, daemon=True).start()
+        self.toggle_ui(state=tk.DISABLED)
+        self.clear_tabs()  # Clear the content of tabs
+        Thread(target=self.scrape_episodes, args=(self.podcast_choice.get(),), daemon=True).start()
 
     def update_media_links(self):
-        Thread(target=self.extract_media_from_tabs, daemon=True).start()
-
-    def scrape_episodes(self):
         self.toggle_ui(state=tk.DISABLED)
-        self.clear_tabs()  # Clear the content of tabs
+        # Use only episode links from the episode tab (ones the user added)
+        current_links = [url for url in self.episode_tab.get(1.0, tk.END).strip().split('\n') if url]
+        self.media_tab.delete(1.0, tk.END)
+        self.failed_tab.delete(1.0, tk.END)
+        Thread(target=self.extract_media_from_tabs, args=(current_links,), daemon=True).start()
 
+    def scrape_episodes(self, podcast_type):
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36',
-                'Accept-Language': 'en-US,en;q=0.9'
-            }
-            base_url = self.get_base_url()
+            base_url = self.get_base_url(podcast_type)
 
-            self.episode_links = self.get_sorted_episodes(base_url, headers)
+            self.episode_links = self.get_sorted_episodes(base_url)
 
             if not self.episode_links:
-                messagebox.showwarning("Warning", "No episodes found!")
+                self.run_on_ui(messagebox.showwarning, "Warning", "No episodes found!")
                 return
 
-            self.episode_tab.insert(tk.END, "\n".join(self.episode_links))
-            self.update_btn['state'] = tk.NORMAL  # Enable the update button
-            self.save_btn['state'] = tk.NORMAL
+            self.append_text(self.episode_tab, "\n".join(self.episode_links))
             self.update_status(f"Found {len(self.episode_links)} episodes")
 
         except Exception as e:
-            messagebox.showerror("Error", str(e))
+            self.run_on_ui(messagebox.showerror, "Error", str(e))
         finally:
-            self.toggle_ui(state=tk.NORMAL)
+            self.run_on_ui(self.toggle_ui, tk.NORMAL)
 
-    def get_base_url(self):
-        podcast_type = self.podcast_choice.get()
+    def get_base_url(self, podcast_type):
         if podcast_type == "The English We Speak":
             return "https://www.bbc.co.uk/learningenglish/english/features/the-english-we-speak"
         elif podcast_type == "6 Minute English":
@@ -118,97 +203,108 @@ class PodcastScraper:
         else:
             raise ValueError("Unknown podcast type")
 
-    def get_sorted_episodes(self, base_url, headers):
+    def get_sorted_episodes(self, base_url):
         episodes = []
-        page = 1
+        seen = set()
+        page_urls = [f"{base_url}?page={page}" if page > 1 else base_url for page in range(1, 11)]
+
+        futures = []
+
+        # Walk pages in order so we still stop at the first empty, repeated or failing page
+        for page in range(1, len(page_urls) + 1):
+            while len(futures) < min(page + PAGE_LOOKAHEAD, len(page_urls)):
+                futures.append(self.executor.submit(self.get_episode_links, page_urls[len(futures)], base_url))
 
-        while page <= 10:
             try:
-                url = f"{base_url}?page={page}" if page > 1 else base_url
-                response = requests.get(url, headers=headers, timeout=15)
-                if response.status_code != 200:
+                links = futures[page - 1].result()
+                if links is None:
                     break
 
-                soup = BeautifulSoup(response.text, 'html.parser')
-                # Adjust regex to match all episode links
-                pattern = re.compile(
-                    r'/(the-english-we-speak[-_/]20\d{2}[-_/]ep-\d+|'
-                    r'features/the-english-we-speak/ep-\d+|'
-                    r'features/the-english-we-speak_\d{4}/ep-\d+|'
-                    r'6-minute-english_\d{4}/ep-\d+|features/6-minute-english/ep-\d+)', re.IGNORECASE
-                )
-
-                links = soup.find_all('a', href=pattern)
-                for link in links:
-                    href = link.get('href')
-                    full_url = urljoin(base_url, href)
-                    if full_url not in episodes:
+                new_this_page = 0
+                for full_url in links:
+                    if full_url not in seen:
+                        seen.add(full_url)
                         episodes.append(full_url)
+                        new_this_page += 1
 
-                if not links:
+                # An empty page, or one that only repeats earlier episodes, means we're past the end
+                if new_this_page == 0:
                     break
 
-                page += 1
-
             except Exception as e:
-                messagebox.showwarning("Error", f"Page {page} error: {str(e)}")
+                self.run_on_ui(messagebox.showwarning, "Error", f"Page {page} error: {str(e)}")
                 break
 
-        return sorted(
-            episodes,
-            key=lambda x: re.search(r'ep-(\d{6})', x).group(1),
-            reverse=False
-        )
+        # Drop any lookahead fetches still queued after an early stop
+        for future in futures:
+            future.cancel()
 
-    def extract_media_from_tabs(self):
-        self.toggle_ui(state=tk.DISABLED)
-        self.media_tab.delete(1.0, tk.END)
-        self.failed_tab.delete(1.0, tk.END)
+        # Decorate each link with its episode number once; links without one can't be ordered
+        keyed = [(EP_NUM.search(url), url) for url in episodes]
+        keyed = [(match.group(1), url) for match, url in keyed if match]
+        keyed.sort()
+        return [url for _, url in keyed]
 
+    def extract_media_from_tabs(self, current_links):
         try:
-            headers = {'User-Agent': 'Mozilla/5.0'}
-
-            # Use only episode links from the episode tab (ones the user added)
-            current_links = self.episode_tab.get(1.0, tk.END).strip().split('\n')
-            
-            for idx, url in enumerate(current_links, 1):
-                if url:
-                    self.update_status(f"Processing {idx}/{len(current_links)}")
-                    pdf, audio = self.get_media_links(url, headers)
-
-                    # Add only the media links, without labels, to the media tab
-                    if pdf != "N/A" or audio != "N/A":
-                        if pdf != "N/A":
-                            self.media_tab.insert(tk.END, f"{pdf}\n")
-                        else:
-                            self.failed_tab.insert(tk.END, f"Failed to find PDF for {url}\n")
-                        
-                        if audio != "N/A":
-                            self.media_tab.insert(tk.END, f"{audio}\n")
-                        else:
-                            self.failed_tab.insert(tk.END, f"Failed to find Audio for {url}\n")
+            results = [None] * len(current_links)
+
+            futures = {self.executor.submit(self.get_media_links, url): idx for idx, url in enumerate(current_links)}
+            for done, future in enumerate(as_completed(futures), 1):
+                results[futures[future]] = future.result()
+                self.update_status(f"Processing {done}/{len(current_links)}")
+
+            # Build results in episode order, not completion order, and insert each tab once
+            media_lines = []
+            failed_lines = []
+            for url, (pdf, audio) in zip(current_links, results):
+                # Add only the media links, without labels, to the media tab
+                if pdf != "N/A" or audio != "N/A":
+                    if pdf != "N/A":
+                        media_lines.append(f"{pdf}\n")
+                    else:
+                        failed_lines.append(f"Failed to find PDF for {url}\n")
+                    
+                    if audio != "N/A":
+                        media_lines.append(f"{audio}\n")
                     else:
-                        self.failed_tab.insert(tk.END, f"Both PDF and Audio missing for {url}\n")
+                        failed_lines.append(f"Failed to find Audio for {url}\n")
+                else:
+                    failed_lines.append(f"Both PDF and Audio missing for {url}\n")
+
+            self.append_text(self.media_tab, ''.join(media_lines))
+            self.append_text(self.failed_tab, ''.join(failed_lines))
 
             self.update_status("Media extraction completed!")
 
         except Exception as e:
-            messagebox.showerror("Error", str(e))
+            self.run_on_ui(messagebox.showerror, "Error", str(e))
         finally:
-            self.toggle_ui(state=tk.NORMAL)
-
-    def get_media_links(self, url, headers):
+            self.run_on_ui(self.toggle_ui, tk.NORMAL)
+
+    def fetch(self, url, timeout):
+        # Space out requests per host so parallel workers stay polite to the BBC
+        host = urlparse(url).netloc
+        with self.throttle_lock:
+            now = time.monotonic()
+            start = max(now, self.next_request.get(host, 0.0))
+            self.next_request[host] = start + MIN_REQUEST_INTERVAL
+        if start > now:
+            time.sleep(start - now)
+
+        return self.session.get(url, timeout=timeout)
+
+    def get_episode_links(self, url, base_url):
+        # Fetch and parse one listing page on a worker; None means the page doesn't exist
+        response = self.fetch(url, 15)
+        if response.status_code != 200:
+            return None
+        return parse_episode_links(response.content, base_url)
+
+    def get_media_links(self, url):
         try:
-            response = requests.get(url, headers=headers, timeout=10)
-            soup = BeautifulSoup(response.text, 'html.parser')
-
-            pdf_link = soup.find('a', href=re.compile(r'\.pdf$', re.I))
-            pdf = urljoin(url, pdf_link['href']) if pdf_link else "N/A"
-
-            audio_link = soup.find('a', href=re.compile(r'\.mp3$', re.I))
-            audio = urljoin(url, audio_link['href']) if audio_link else "N/A"
-
-            return pdf, audio
+            response = self.fetch(url, 10)
+            return parse_media_links(response.text, url)
 
         except Exception as e:
             return "N/A", "N/A"
@@ -239,9 +335,15 @@ class PodcastScraper:
         except tk.TclError:
             pass
 
+    def run_on_ui(self, func, *args):
+        # Tk widgets are not thread-safe, so background threads schedule widget calls on the main loop
+        self.root.after(0, func, *args)
+
+    def append_text(self, widget, text):
+        self.run_on_ui(widget.insert, tk.END, text)
+
     def update_status(self, message):
-        self.status_label.config(text=message)
-        self.root.update_idletasks()
+        self.run_on_ui(lambda: self.status_label.config(text=message))
 
     def toggle_ui(self, state):
         self.scrape_btn['state'] = state
@@ -258,3 +360,4 @@ if __name__ == "__main__":
     root = tk.Tk()
     app = PodcastScraper(root)
     root.mainloop()
+    app.executor.shutdown(wait=False, cancel_futures=True)
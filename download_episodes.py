@@ -6,30 +6,79 @@ Downloads PDF and MP3 files and organizes them into subdirectories by episode na
 
 import os
 import re
+import json
+import argparse
+import shutil
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from pathlib import Path
 from urllib.parse import urlparse
 from typing import List, Tuple
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+
+# Trailing '_download', '_download_' or '_worksheet' on a media filename
+SUFFIX_RE = re.compile(r'_(download_?|worksheet)$', re.IGNORECASE)
+# Pattern: YYMMDD_(6min_english|6_minute_english)_episode_name
+EPISODE_NAME_RE = re.compile(r'(\d{6}_(?:6min_english|6_minute_english)_.+)', re.IGNORECASE)
+SERIES_RE = re.compile(r'_6_?min(?:ute)?_english', re.IGNORECASE)
+# Everything stripped from a downloaded filename: the _download/_worksheet
+# suffixes, the series name and apostrophes
+FILENAME_CLEAN_RE = re.compile(r"_download_?(?=\.mp3$)|_worksheet(?=\.pdf$)|_6_minute_english|'")
+# Characters not allowed in directory names on common filesystems
+FSBAD_RE = re.compile(r'[<>:"/\\|?*]')
+# Completed downloads between checkpoint writes
+CHECKPOINT_EVERY = 10
 
 
 class EpisodeDownloader:
-    def __init__(self, links_file: str, base_download_dir: str = "download"):
+    def __init__(self, links_file: str, base_download_dir: str = "download", max_workers: int = 4,
+                 min_interval: float = 1.5, recheck: bool = False):
         """
         Initialize the downloader
         
         Args:
             links_file: Path to the file containing download links
             base_download_dir: Base directory for downloads
+            max_workers: Number of files to download concurrently
+            min_interval: Minimum seconds between starting requests to the same host
+            recheck: Ignore the checkpoint and check the disk for every file again
         """
         self.links_file = links_file
         self.base_download_dir = Path(base_download_dir)
         self.base_download_dir.mkdir(exist_ok=True)
+        self.max_workers = max_workers
+        self.min_interval = min_interval
+        self._print_lock = Lock()
+        self._throttle_lock = Lock()
+        self._next_request = {}
+        
+        # URLs already downloaded by earlier runs, so a resumed run can skip them
+        # without touching their episode directories
+        self.checkpoint = self.base_download_dir / '.done.json'
+        self.done = set() if recheck else self._load_checkpoint()
+        self._checkpoint_lock = Lock()
+        self._unsaved = 0
         
         # Headers to mimic a browser request
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36',
             'Accept': '*/*'
         }
+        
+        # Reuse one session so downloads from the BBC CDN share connections,
+        # retrying rate-limit and server errors with exponential backoff
+        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                      allowed_methods=['GET'], raise_on_status=False)
+        adapter = HTTPAdapter(pool_maxsize=10, max_retries=retry)
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
     
     def extract_episode_name(self, url: str) -> str:
         """
@@ -43,20 +92,30 @@ class EpisodeDownloader:
         """
         # Extract filename from URL
         filename = os.path.basename(urlparse(url).path)
+        return self.episode_name_from_filename(filename)
+    
+    def episode_name_from_filename(self, filename: str) -> str:
+        """
+        Extract episode name from a download's filename
         
+        Args:
+            filename: Last path component of a download URL
+            
+        Returns:
+            Episode name as a clean directory name
+        """
         # Remove file extension
         name_without_ext = os.path.splitext(filename)[0]
         
         # Remove common suffixes like '_download', '_download_', and '_worksheet' (case-insensitive)
-        name_without_ext = re.sub(r'_(download_?|worksheet)$', '', name_without_ext, flags=re.IGNORECASE)
+        name_without_ext = SUFFIX_RE.sub('', name_without_ext)
         
         # Extract the episode name including date
-        # Pattern: YYMMDD_(6min_english|6_minute_english)_episode_name
-        match = re.search(r'(\d{6}_(?:6min_english|6_minute_english)_.+)', name_without_ext, flags=re.IGNORECASE)
+        match = EPISODE_NAME_RE.search(name_without_ext)
         if match:
             episode_name = match.group(1)
             # Remove _6_minute_english or _6min_english from the folder name
-            episode_name = re.sub(r'_6_?min(?:ute)?_english', '', episode_name, flags=re.IGNORECASE)
+            episode_name = SERIES_RE.sub('', episode_name)
             # Remove apostrophes and other problematic characters
             episode_name = episode_name.replace("'", "")
             return episode_name
@@ -64,35 +123,30 @@ class EpisodeDownloader:
         # Fallback: return the cleaned name as-is
         return name_without_ext
     
-    def parse_links_file(self) -> List[Tuple[str, str, List[str]]]:
+    def parse_links_file(self) -> List[Tuple[str, str, List[Tuple[str, str]]]]:
         """
         Parse the links file and group PDF and MP3 by episode
         
         Returns:
-            List of tuples (episode_name, episode_dir, [pdf_url, mp3_url])
+            List of tuples (episode_name, episode_dir, [(pdf_url, pdf_filename), (mp3_url, mp3_filename)])
         """
-        with open(self.links_file, 'r') as f:
-            lines = [line.strip() for line in f if line.strip()]
-        
-        episodes = {}
+        # Keyed by episode name, so the name itself isn't stored again in the value
+        episodes = defaultdict(lambda: {'pdf': None, 'mp3': None})
         
-        for url in lines:
+        # Read the whole file at once; blank and non-URL lines are skipped below
+        for line in Path(self.links_file).read_text().splitlines():
+            url = line.strip()
             if not url.startswith('http'):
                 continue
                 
-            episode_name = self.extract_episode_name(url)
-            
-            if episode_name not in episodes:
-                episodes[episode_name] = {
-                    'name': episode_name,
-                    'pdf': None,
-                    'mp3': None
-                }
+            # Parse the URL once; the filename is reused when saving the download
+            filename = os.path.basename(urlparse(url).path)
+            episode = episodes[self.episode_name_from_filename(filename)]
             
             if url.endswith('.pdf'):
-                episodes[episode_name]['pdf'] = url
+                episode['pdf'] = (url, filename)
             elif url.endswith('.mp3'):
-                episodes[episode_name]['mp3'] = url
+                episode['mp3'] = (url, filename)
         
         # Convert to list format
         result = []
@@ -107,14 +161,57 @@ class EpisodeDownloader:
                 # Create episode directory name (safe for filesystem)
                 # Replace apostrophes and other problematic characters
                 safe_dir_name = ep_name.replace("'", "").replace("`", "")
-                safe_dir_name = re.sub(r'[<>:"/\\|?*]', '', safe_dir_name)
+                safe_dir_name = FSBAD_RE.sub('', safe_dir_name)
                 result.append((ep_name, safe_dir_name, urls))
         
         return result
     
+    def _log(self, message: str):
+        """Print a whole line without interleaving output from other download workers"""
+        with self._print_lock:
+            print(message)
+    
+    def _load_checkpoint(self) -> set:
+        """
+        Load the set of completed URLs from the checkpoint file
+        
+        Returns:
+            Set of URLs, empty if there is no usable checkpoint
+        """
+        try:
+            return set(json.loads(self.checkpoint.read_text()))
+        except (OSError, ValueError, TypeError):
+            return set()
+    
+    def _save_checkpoint(self):
+        """Write the completed URLs to the checkpoint file (caller holds _checkpoint_lock)"""
+        tmp_path = self.checkpoint.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(sorted(self.done)))
+        os.replace(tmp_path, self.checkpoint)
+        self._unsaved = 0
+    
+    def _mark_done(self, url: str):
+        """Record a completed URL, flushing the checkpoint every CHECKPOINT_EVERY completions"""
+        with self._checkpoint_lock:
+            self.done.add(url)
+            self._unsaved += 1
+            if self._unsaved >= CHECKPOINT_EVERY:
+                self._save_checkpoint()
+    
+    def _throttle(self, url: str):
+        """Wait until at least min_interval has passed since the last request to url's host"""
+        host = urlparse(url).netloc
+        with self._throttle_lock:
+            now = time.monotonic()
+            start = max(now, self._next_request.get(host, 0.0))
+            self._next_request[host] = start + self.min_interval
+        if start > now:
+            time.sleep(start - now)
+    
     def download_file(self, url: str, save_path: Path) -> bool:
         """
-        Download a file from URL to save_path
+        Download a file from URL to save_path, via a .part file that is only
+        renamed into place once the whole body has been written
         
         Args:
             url: URL to download
@@ -123,27 +220,38 @@ class EpisodeDownloader:
         Returns:
             True if successful, False otherwise
         """
+        part_path = save_path.with_name(save_path.name + '.part')
         try:
-            print(f"  Downloading: {os.path.basename(save_path)}")
-            response = requests.get(url, headers=self.headers, stream=True, timeout=30)
-            response.raise_for_status()
-            
-            # Write file in chunks
-            with open(save_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
+            self._log(f"  Downloading: {os.path.basename(save_path)}")
+            self._throttle(url)
+            with self.session.get(url, stream=True, timeout=30) as response:
+                response.raise_for_status()
+                
+                # Copy the body straight to disk in 1 MiB blocks, undoing any gzip/deflate
+                response.raw.decode_content = True
+                with open(part_path, 'wb') as f:
+                    shutil.copyfileobj(response.raw, f, length=1024 * 1024)
+            os.replace(part_path, save_path)
             
-            file_size = os.path.getsize(save_path)
-            print(f"    ✓ Downloaded successfully ({file_size:,} bytes)")
+            file_size = save_path.stat().st_size
+            self._log(f"    ✓ Downloaded {os.path.basename(save_path)} ({file_size:,} bytes)")
             return True
             
         except requests.exceptions.RequestException as e:
-            print(f"    ✗ Failed to download: {e}")
+            part_path.unlink(missing_ok=True)
+            self._log(f"    ✗ Failed to download {os.path.basename(save_path)}: {e}")
             return False
         except Exception as e:
-            print(f"    ✗ Error: {e}")
+            part_path.unlink(missing_ok=True)
+            self._log(f"    ✗ Error downloading {os.path.basename(save_path)}: {e}")
+            return False
+    
+    def _download_and_record(self, url: str, save_path: Path) -> bool:
+        """Download a file and add its URL to the checkpoint on success"""
+        if not self.download_file(url, save_path):
             return False
+        self._mark_done(url)
+        return True
     
     def download_episodes(self) -> Tuple[int, int, int]:
         """
@@ -159,41 +267,77 @@ class EpisodeDownloader:
         
         print(f"Found {total_episodes} episodes to download\n")
         
-        for i, (episode_name, dir_name, urls) in enumerate(episodes, 1):
-            print(f"[{i}/{total_episodes}] {episode_name}")
-            
-            # Create episode directory
-            episode_dir = self.base_download_dir / dir_name
-            episode_dir.mkdir(exist_ok=True)
+        # Per-episode (checkpointed filenames, skipped filenames, download futures), in episode order
+        episode_tasks = []
+        
+        # Queue every missing file up front so downloads overlap across episodes
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            for episode_name, dir_name, urls in episodes:
+                recorded = []
+                skipped = []
+                futures = []
+                
+                # Files recorded in the checkpoint need no filesystem check at all
+                pending = []
+                for url, filename in urls:
+                    # Clean filename by removing _download(_), _worksheet, _6_minute_english and apostrophes
+                    clean_filename = FILENAME_CLEAN_RE.sub('', filename)
+                    if url in self.done:
+                        recorded.append(clean_filename)
+                    else:
+                        pending.append((url, clean_filename))
+                
+                if pending:
+                    # Create episode directory
+                    episode_dir = self.base_download_dir / dir_name
+                    episode_dir.mkdir(exist_ok=True)
+                    
+                    # One directory listing instead of a stat per file
+                    with os.scandir(episode_dir) as entries:
+                        existing = {entry.name for entry in entries}
+                    
+                    for url, clean_filename in pending:
+                        # Skip if file already exists, and remember it for next time
+                        if clean_filename in existing:
+                            skipped.append(clean_filename)
+                            self._mark_done(url)
+                            continue
+                        
+                        save_path = episode_dir / clean_filename
+                        futures.append(executor.submit(self._download_and_record, url, save_path))
+                
+                episode_tasks.append((recorded, skipped, futures))
             
-            # Download each file for this episode
-            episode_success = True
-            for url in urls:
-                filename = os.path.basename(urlparse(url).path)
+            # Report each episode in order as soon as its own downloads finish
+            print()
+            for i, ((episode_name, _, _), (recorded, skipped, futures)) in enumerate(zip(episodes, episode_tasks), 1):
+                print(f"[{i}/{total_episodes}] {episode_name}")
                 
-                # Clean filename by removing _download, _worksheet, and _6_minute_english
-                # Also handle apostrophes and other special characters
-                clean_filename = filename.replace('_download.mp3', '.mp3').replace('_worksheet.pdf', '.pdf')
-                clean_filename = clean_filename.replace('_download_.mp3', '.mp3')  # Handle trailing underscore
-                clean_filename = clean_filename.replace('_6_minute_english', '')
-                clean_filename = clean_filename.replace("'", "")  # Remove apostrophes from filename
-                save_path = episode_dir / clean_filename
+                for clean_filename in recorded:
+                    print(f"  Skipping: {clean_filename} (recorded in checkpoint)")
                 
-                # Skip if file already exists
-                if save_path.exists():
+                for clean_filename in skipped:
                     print(f"  Skipping: {clean_filename} (already exists)")
-                    continue
                 
-                if not self.download_file(url, save_path):
-                    episode_success = False
-                    failed += 1
+                results = [future.result() for future in futures]
+                successful += results.count(True)
+                failed += results.count(False)
+                
+                if all(results):
+                    print(f"  ✓ Episode complete\n")
                 else:
-                    successful += 1
-            
-            if episode_success:
-                print(f"  ✓ Episode complete\n")
-            else:
-                print(f"  ⚠ Episode completed with errors\n")
+                    print(f"  ⚠ Episode completed with errors\n")
+        except KeyboardInterrupt:
+            # Drop queued downloads instead of draining the whole queue before exiting,
+            # and report what finished so far
+            print("\nInterrupted, cancelling remaining downloads\n")
+            executor.shutdown(wait=False, cancel_futures=True)
+        finally:
+            # Every future has finished unless interrupted; then only in-flight files remain
+            executor.shutdown(wait=False)
+            with self._checkpoint_lock:
+                self._save_checkpoint()
         
         return total_episodes, successful, failed
     
@@ -204,6 +348,9 @@ class EpisodeDownloader:
         print("=" * 60)
         print(f"Links file: {self.links_file}")
         print(f"Download directory: {self.base_download_dir.absolute()}")
+        if self.done:
+            print(f"Checkpoint: {self.checkpoint} ({len(self.done)} files recorded, "
+                  f"run with --recheck to ignore it)")
         print("=" * 60 + "\n")
         
         total, successful, failed = self.download_episodes()
@@ -220,6 +367,11 @@ class EpisodeDownloader:
 
 def main():
     """Main entry point"""
+    parser = argparse.ArgumentParser(description="Download BBC podcast episodes listed in a links file")
+    parser.add_argument('--recheck', action='store_true',
+                        help="ignore the download checkpoint and check the disk for every file")
+    args = parser.parse_args()
+    
     # Configuration
     LINKS_FILE = "6_minute_english-pdf_mp3_link-test.txt"
     DOWNLOAD_DIR = "download"
@@ -231,7 +383,7 @@ def main():
         return
     
     # Create downloader and run
-    downloader = EpisodeDownloader(LINKS_FILE, DOWNLOAD_DIR)
+    downloader = EpisodeDownloader(LINKS_FILE, DOWNLOAD_DIR, recheck=args.recheck)
     downloader.run()
 
 
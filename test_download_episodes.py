@@ -4,20 +4,95 @@ Test cases for BBC Podcast Episode Downloader
 Tests folder name creation and MP3/PDF file naming
 """
 
+import io
+import json
 import os
+import re
+import stat
+import sys
+import tempfile
 import unittest
+from contextlib import redirect_stdout
+from unittest import mock
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from download_episodes import EpisodeDownloader
 
 
+def _scan(root):
+    """Yield (parent, DirEntry) for every non-directory under root, using scandir's cached file types"""
+    stack = [root]
+    while stack:
+        parent = stack.pop()
+        with os.scandir(parent) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                else:
+                    yield parent, entry
+
+
 class TestEpisodeDownloader(unittest.TestCase):
     """Test cases for EpisodeDownloader"""
     
+    # Forbidden characters in filenames: < > : " / \ | ? *
+    _FORBIDDEN = re.compile(r'[<>:"/\\|?*]')
+    
+    # Known episode folders; each one's files should start with the folder name
+    folder_names = (
+        "251106_do_you_like_garlic",
+        "251113_how_important_is_play",
+        "251030_is_breakfast_the_most_important_meal_of_the_day",
+    )
+    
+    @classmethod
+    def setUpClass(cls):
+        """Build the downloader and parse the links file once for the whole class"""
+        cls.test_links_file = "6_minute_english-pdf_mp3_link-test.txt"
+        cls.download_dir = "download"
+        cls.downloader = EpisodeDownloader(cls.test_links_file, cls.download_dir)
+        cls.episodes = cls.downloader.parse_links_file()
+        
+        # Independent description of a 6 Minute English filename, used to sanity-check test data
+        cls._expected_re = re.compile(r'^(\d{6})_6_minute_english_(.+?)(?:_worksheet|_download_?)$')
+        
+        # Walk the download directory once and share the listings (as DirEntry objects) across tests
+        cls.base_path = Path(cls.download_dir)
+        cls._folders = []
+        scanned = []
+        if cls.base_path.is_dir():
+            # List download/ itself once, then walk each episode folder below it
+            with os.scandir(cls.download_dir) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        cls._folders.append(Path(entry.path))
+                        scanned.extend(_scan(entry.path))
+                    else:
+                        scanned.append((cls.download_dir, entry))
+        cls._all_files = [entry for _, entry in scanned]
+        cls._mp3_files = [entry for entry in cls._all_files if entry.name.endswith('.mp3')]
+        cls._pdf_files = [entry for entry in cls._all_files if entry.name.endswith('.pdf')]
+        
+        # Episode folder -> files directly inside it, split by type, plus their base names;
+        # built from the same walk so every folder query below is a lookup
+        cls._folder_index = {folder: {'pdf': [], 'mp3': [], 'other': [], 'stems': set()}
+                             for folder in cls._folders}
+        for parent, entry in scanned:
+            index = cls._folder_index.get(Path(parent))
+            if index is None:
+                continue
+            if entry.name.endswith('.pdf'):
+                index['pdf'].append(entry)
+            elif entry.name.endswith('.mp3'):
+                index['mp3'].append(entry)
+            else:
+                index['other'].append(entry)
+            index['stems'].add(entry.name.rsplit('.', 1)[0])
+    
     def setUp(self):
         """Set up test fixtures"""
-        self.test_links_file = "6_minute_english-pdf_mp3_link-test.txt"
-        self.download_dir = "download"
-        self.downloader = EpisodeDownloader(self.test_links_file, self.download_dir)
+        self.downloader = type(self).downloader
+        self.episodes = type(self).episodes
     
     def test_extract_episode_name(self):
         """Test episode name extraction from URLs"""
@@ -48,58 +123,56 @@ class TestEpisodeDownloader(unittest.TestCase):
             }
         ]
         
-        for test_case in test_cases:
-            with self.subTest(url=test_case['url']):
-                result = self.downloader.extract_episode_name(test_case['url'])
-                self.assertEqual(result, test_case['expected'],
-                               f"Failed to extract correct episode name from {test_case['url']}")
+        urls = [test_case['url'] for test_case in test_cases]
+        expected = [test_case['expected'] for test_case in test_cases]
+        
+        # The expected names should follow directly from the filenames
+        stems = [os.path.splitext(os.path.basename(url))[0] for url in urls]
+        matches = [self._expected_re.match(stem) for stem in stems]
+        self.assertEqual([f"{m.group(1)}_{m.group(2)}".replace("'", "") if m else None for m in matches],
+                         expected, "Test data does not match the expected filename pattern")
+        
+        results = [self.downloader.extract_episode_name(url) for url in urls]
+        self.assertEqual(results, expected, "Failed to extract correct episode names")
     
     def test_parse_links_file(self):
         """Test parsing of links file and grouping by episode"""
-        episodes = self.downloader.parse_links_file()
-        
         # Should have 4 episodes in test file
-        self.assertEqual(len(episodes), 4, "Should parse 4 episodes from test file")
+        self.assertEqual(len(self.episodes), 4, "Should parse 4 episodes from test file")
         
         # Check that each episode has both PDF and MP3
-        for episode_name, dir_name, urls in episodes:
+        for episode_name, dir_name, urls in self.episodes:
             with self.subTest(episode=episode_name):
                 self.assertEqual(len(urls), 2, f"Episode '{episode_name}' should have 2 files (PDF and MP3)")
                 
                 # Check file extensions
-                extensions = [url.split('.')[-1] for url in urls]
-                self.assertIn('pdf', extensions, f"Episode '{episode_name}' should have a PDF file")
-                self.assertIn('mp3', extensions, f"Episode '{episode_name}' should have an MP3 file")
+                extensions = {url.rpartition('.')[2] for url, filename in urls}
+                self.assertEqual(extensions, {'pdf', 'mp3'}, f"Episode '{episode_name}' should have a PDF and an MP3 file")
     
     def test_folder_names_exist(self):
         """Test that episode folders are created with correct names"""
-        base_path = Path(self.download_dir)
+        base_path = self.base_path
         
-        # Check that folders exist (actual folder names may vary based on creation logic)
-        episodes = self.downloader.parse_links_file()
+        # Check that folders exist (actual folder names may vary based on creation logic).
+        # For this test, we'll just verify the download directory exists
+        # and contains folders - actual naming may be customized
+        self.assertTrue(base_path.exists(), 
+                      f"Download directory '{self.download_dir}' should exist")
         
-        for episode_name, dir_name, urls in episodes:
-            folder_path = base_path / dir_name
-            with self.subTest(folder=dir_name):
-                # For this test, we'll just verify the download directory exists
-                # and contains folders - actual naming may be customized
-                self.assertTrue(base_path.exists(), 
-                              f"Download directory '{self.download_dir}' should exist")
-                
-                # Count folders in download directory
-                folders = [f for f in base_path.iterdir() if f.is_dir()]
-                self.assertGreater(len(folders), 0,
-                                 f"Download directory should contain at least one episode folder")
+        # Count folders in download directory (listed once by the class-level scandir walk)
+        folders = self._folders
+        self.assertGreater(len(folders), 0,
+                         f"Download directory should contain at least one episode folder")
     
     def test_mp3_files_exist(self):
         """Test that MP3 files exist with correct names in their folders"""
-        base_path = Path(self.download_dir)
+        base_path = self.base_path
         
         if not base_path.exists():
             self.skipTest("Download directory does not exist")
         
-        # Find all MP3 files recursively
-        mp3_files = list(base_path.rglob('*.mp3'))
+        # All MP3 files found recursively by the class-level walk
+        mp3_files = self._mp3_files
         
         # Should have at least 3 MP3 files (one per episode)
         self.assertGreaterEqual(len(mp3_files), 3,
@@ -108,27 +181,23 @@ class TestEpisodeDownloader(unittest.TestCase):
         # Check each MP3 file
         for mp3_file in mp3_files:
             with self.subTest(file=mp3_file.name):
-                # Check file exists and is not empty
-                self.assertTrue(mp3_file.exists(), 
-                              f"MP3 file '{mp3_file.name}' should exist")
-                self.assertTrue(mp3_file.is_file(), 
-                              f"'{mp3_file.name}' should be a file")
-                self.assertGreater(mp3_file.stat().st_size, 0,
-                                 f"MP3 file '{mp3_file.name}' should not be empty")
-                
-                # Check filename pattern: should end with .mp3
-                self.assertTrue(mp3_file.name.endswith('.mp3'),
-                              f"MP3 file '{mp3_file.name}' should end with '.mp3'")
+                # Check file is a regular file and is not empty (one cached stat)
+                # (messages are only formatted on failure)
+                st = mp3_file.stat()
+                if not stat.S_ISREG(st.st_mode):
+                    self.fail(f"'{mp3_file.name}' should be a file")
+                if st.st_size <= 0:
+                    self.fail(f"MP3 file '{mp3_file.name}' should not be empty")
     
     def test_pdf_files_exist(self):
         """Test that PDF files exist with correct names in their folders"""
-        base_path = Path(self.download_dir)
+        base_path = self.base_path
         
         if not base_path.exists():
             self.skipTest("Download directory does not exist")
         
-        # Find all PDF files recursively
-        pdf_files = list(base_path.rglob('*.pdf'))
+        # All PDF files found recursively by the class-level walk
+        pdf_files = self._pdf_files
         
         # Should have at least 3 PDF files (one per episode)
         self.assertGreaterEqual(len(pdf_files), 3,
@@ -137,104 +206,79 @@ class TestEpisodeDownloader(unittest.TestCase):
         # Check each PDF file
         for pdf_file in pdf_files:
             with self.subTest(file=pdf_file.name):
-                # Check file exists and is not empty
-                self.assertTrue(pdf_file.exists(), 
-                              f"PDF file '{pdf_file.name}' should exist")
-                self.assertTrue(pdf_file.is_file(), 
-                              f"'{pdf_file.name}' should be a file")
-                self.assertGreater(pdf_file.stat().st_size, 0,
-                                 f"PDF file '{pdf_file.name}' should not be empty")
-                
-                # Check filename pattern: should end with .pdf
-                self.assertTrue(pdf_file.name.endswith('.pdf'),
-                              f"PDF file '{pdf_file.name}' should end with '.pdf'")
+                # Check file is a regular file and is not empty (one cached stat)
+                # (messages are only formatted on failure)
+                st = pdf_file.stat()
+                if not stat.S_ISREG(st.st_mode):
+                    self.fail(f"'{pdf_file.name}' should be a file")
+                if st.st_size <= 0:
+                    self.fail(f"PDF file '{pdf_file.name}' should not be empty")
     
     def test_folder_name_sanitization(self):
         """Test that folder names are properly sanitized for filesystem"""
-        episodes = self.downloader.parse_links_file()
-        
-        # Forbidden characters in filenames: < > : " / \ | ? *
-        forbidden_chars = ['<', '>', ':', '"', '/', '\\', '|', '?', '*']
-        
-        for episode_name, dir_name, urls in episodes:
+        for episode_name, dir_name, urls in self.episodes:
             with self.subTest(folder=dir_name):
-                for char in forbidden_chars:
-                    self.assertNotIn(char, dir_name, 
-                                   f"Folder name '{dir_name}' should not contain forbidden character '{char}'")
+                bad = self._FORBIDDEN.search(dir_name)
+                if bad:
+                    self.fail(f"Folder name '{dir_name}' should not contain forbidden character '{bad.group()}'")
     
     def test_file_count_per_episode(self):
         """Test that each episode folder contains exactly 2 files (1 PDF + 1 MP3)"""
-        base_path = Path(self.download_dir)
-        episodes = self.downloader.parse_links_file()
+        base_path = self.base_path
         
-        for episode_name, dir_name, urls in episodes:
+        for episode_name, dir_name, urls in self.episodes:
             folder_path = base_path / dir_name
-            if folder_path.exists():
-                files = list(folder_path.glob('*'))
+            if folder_path in self._folder_index:
+                index = self._folder_index[folder_path]
                 with self.subTest(folder=dir_name):
-                    self.assertEqual(len(files), 2, 
-                                   f"Folder '{dir_name}' should contain exactly 2 files")
+                    file_count = len(index['pdf']) + len(index['mp3']) + len(index['other'])
+                    if file_count != 2:
+                        self.fail(f"Folder '{dir_name}' should contain exactly 2 files, found {file_count}")
                     
                     # Check we have one PDF and one MP3
-                    pdf_count = len(list(folder_path.glob('*.pdf')))
-                    mp3_count = len(list(folder_path.glob('*.mp3')))
+                    pdf_count = len(index['pdf'])
+                    mp3_count = len(index['mp3'])
                     
-                    self.assertEqual(pdf_count, 1, 
-                                   f"Folder '{dir_name}' should contain exactly 1 PDF file")
-                    self.assertEqual(mp3_count, 1, 
-                                   f"Folder '{dir_name}' should contain exactly 1 MP3 file")
+                    if pdf_count != 1:
+                        self.fail(f"Folder '{dir_name}' should contain exactly 1 PDF file, found {pdf_count}")
+                    if mp3_count != 1:
+                        self.fail(f"Folder '{dir_name}' should contain exactly 1 MP3 file, found {mp3_count}")
     
     def test_filename_consistency(self):
         """Test that filenames match expected pattern and are consistent within folders"""
-        base_path = Path(self.download_dir)
+        base_path = self.base_path
         
         if not base_path.exists():
             self.skipTest("Download directory does not exist")
         
-        # Get all episode folders
-        folders = [f for f in base_path.iterdir() if f.is_dir()]
+        # Episode folders from the class-level walk
+        folders = self._folders
         
         for folder in folders:
             with self.subTest(folder=folder.name):
-                # Get all files in the folder
-                files = list(folder.glob('*'))
-                
-                # Extract base names (without .mp3 or .pdf extensions)
-                base_names = set()
-                for file in files:
-                    base_name = file.stem  # Gets filename without extension
-                    base_names.add(base_name)
+                # Base names of the files in the folder, from the class-level index
+                index = self._folder_index[folder]
+                base_names = index['stems']
                 
                 # All files in the same folder should share the same base name
                 self.assertEqual(len(base_names), 1,
                                f"All files in folder '{folder.name}' should share the same base name")
                 
-                # Check that files follow the naming pattern
-                for file in files:
-                    filename = file.name
-                    if filename.endswith('.mp3'):
-                        self.assertTrue(filename.endswith('.mp3'),
-                                      f"MP3 file '{filename}' should end with '.mp3'")
-                    elif filename.endswith('.pdf'):
-                        self.assertTrue(filename.endswith('.pdf'),
-                                      f"PDF file '{filename}' should end with '.pdf'")
+                # Check that files follow the naming pattern: only .mp3 and .pdf files
+                if index['other']:
+                    self.fail(f"Folder '{folder.name}' should only contain .mp3 and .pdf files, "
+                              f"found {[entry.name for entry in index['other']]}")
 
 
     def test_folder_file_correspondence(self):
         """Test that folder names correspond logically to their file contents"""
-        base_path = Path(self.download_dir)
+        base_path = self.base_path
         
         if not base_path.exists():
             self.skipTest("Download directory does not exist")
         
-        # Map of actual folders to their files
-        folder_mappings = {
-            "251106_do_you_like_garlic": "251106_do_you_like_garlic",
-            "251113_how_important_is_play": "251113_how_important_is_play",
-            "251030_is_breakfast_the_most_important_meal_of_the_day": "251030_is_breakfast_the_most_important_meal_of_the_day"
-        }
-        
-        for folder_name, expected_file_prefix in folder_mappings.items():
+        for folder_name in self.folder_names:
+            expected_file_prefix = folder_name
             folder_path = base_path / folder_name
             if folder_path.exists():
                 with self.subTest(folder=folder_name):
@@ -269,36 +313,130 @@ class TestDownloadIntegrity(unittest.TestCase):
         if not self.download_dir.exists():
             self.skipTest("Download directory does not exist")
         
-        for folder in self.download_dir.iterdir():
-            if folder.is_dir():
-                for file in folder.glob('*'):
-                    with self.subTest(file=f"{folder.name}/{file.name}"):
-                        self.assertGreater(file.stat().st_size, 0,
-                                         f"File '{file.name}' should not be empty")
+        # Stat files concurrently to hide per-call latency on networked filesystems
+        entries = [entry for _, entry in _scan(self.download_dir)]
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            sizes = list(executor.map(lambda entry: entry.stat().st_size, entries))
+        
+        for entry, size in zip(entries, sizes):
+            with self.subTest(file=os.path.relpath(entry.path, self.download_dir)):
+                if size <= 0:
+                    self.fail(f"File '{entry.name}' should not be empty")
+
+
+class TestCheckpoint(unittest.TestCase):
+    """Test cases for the .done.json download checkpoint"""
+    
+    base = 'https://downloads.bbc.co.uk/learningenglish/features/6min/'
+    
+    def setUp(self):
+        """Create a links file and download directory in a temporary directory"""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp_path = Path(tmp.name)
+        self.download_dir = self.tmp_path / "download"
+        self.links_file = self.tmp_path / "links.txt"
+        self.urls = [self.base + '251106_6_minute_english_do_you_like_garlic_worksheet.pdf',
+                     self.base + '251106_6_minute_english_do_you_like_garlic_download.mp3',
+                     self.base + '251113_6_minute_english_how_important_is_play_download.mp3']
+        self.links_file.write_text('\n'.join(self.urls) + '\n')
+    
+    def make_downloader(self, **kwargs):
+        """Build a downloader over the temporary links file and download directory"""
+        return EpisodeDownloader(str(self.links_file), str(self.download_dir), **kwargs)
+    
+    def run_downloads(self, downloader):
+        """Run download_episodes without network access, returning (output, downloaded paths)"""
+        downloaded = []
+        
+        def fake_download(url, save_path):
+            save_path.write_bytes(b'data')
+            downloaded.append(save_path)
+            return True
+        
+        output = io.StringIO()
+        with mock.patch.object(downloader, 'download_file', side_effect=fake_download), \
+                redirect_stdout(output):
+            downloader.download_episodes()
+        return output.getvalue(), downloaded
+    
+    def test_checkpoint_round_trip(self):
+        """Test that completed URLs are saved and loaded by the next downloader"""
+        downloader = self.make_downloader()
+        for url in self.urls[:2]:
+            downloader._mark_done(url)
+        with downloader._checkpoint_lock:
+            downloader._save_checkpoint()
+        
+        self.assertEqual(json.loads(downloader.checkpoint.read_text()), sorted(self.urls[:2]))
+        self.assertEqual(self.make_downloader().done, set(self.urls[:2]))
+    
+    def test_unusable_checkpoint_is_ignored(self):
+        """Test that a missing or malformed checkpoint loads as empty"""
+        self.assertEqual(self.make_downloader().done, set())
+        for content in ('not json', 'null', '42'):
+            with self.subTest(content=content):
+                (self.download_dir / '.done.json').write_text(content)
+                self.assertEqual(self.make_downloader().done, set())
+    
+    def test_checkpoint_and_disk_skips(self):
+        """Test that checkpointed and existing files are skipped and reported separately"""
+        self.download_dir.mkdir()
+        (self.download_dir / '.done.json').write_text(json.dumps([self.urls[0]]))
+        existing = self.download_dir / '251106_do_you_like_garlic' / '251106_do_you_like_garlic.mp3'
+        existing.parent.mkdir()
+        existing.write_bytes(b'data')
+        
+        downloader = self.make_downloader()
+        output, downloaded = self.run_downloads(downloader)
+        
+        self.assertIn("Skipping: 251106_do_you_like_garlic.pdf (recorded in checkpoint)", output)
+        self.assertIn("Skipping: 251106_do_you_like_garlic.mp3 (already exists)", output)
+        self.assertEqual([path.name for path in downloaded], ['251113_how_important_is_play.mp3'])
+        # Every URL, whichever way it was found, ends up in the saved checkpoint
+        self.assertEqual(set(json.loads(downloader.checkpoint.read_text())), set(self.urls))
+    
+    def test_recheck_ignores_checkpoint(self):
+        """Test that recheck=True downloads checkpointed files that are missing on disk"""
+        self.download_dir.mkdir()
+        (self.download_dir / '.done.json').write_text(json.dumps(self.urls))
+        
+        output, downloaded = self.run_downloads(self.make_downloader())
+        self.assertEqual(downloaded, [])
+        
+        output, downloaded = self.run_downloads(self.make_downloader(recheck=True))
+        self.assertNotIn("recorded in checkpoint", output)
+        self.assertEqual(len(downloaded), len(self.urls))
 
 
 def run_tests():
     """Run all tests and print results"""
-    # Create test suite
-    loader = unittest.TestLoader()
-    suite = unittest.TestSuite()
-    
-    # Add test cases
-    suite.addTests(loader.loadTestsFromTestCase(TestEpisodeDownloader))
-    suite.addTests(loader.loadTestsFromTestCase(TestDownloadIntegrity))
+    # Create test suite from every test case in this module
+    suite = unittest.TestLoader().loadTestsFromModule(sys.modules[__name__])
     
-    # Run tests with verbose output
-    runner = unittest.TextTestRunner(verbosity=2)
-    result = runner.run(suite)
+    if os.environ.get('TESTS_VERBOSE') == '1':
+        # Run tests with verbose output
+        result = unittest.TextTestRunner(verbosity=2).run(suite)
+    else:
+        # A plain TestResult only records outcomes; print details for problems alone
+        result = unittest.TestResult()
+        suite.run(result)
+        for label, problems in (("ERROR", result.errors), ("FAIL", result.failures)):
+            for test, traceback in problems:
+                print("=" * 70)
+                print(f"{label}: {test}")
+                print("-" * 70)
+                print(traceback)
     
     # Print summary
     print("\n" + "=" * 70)
     print("Test Summary")
     print("=" * 70)
     print(f"Tests run: {result.testsRun}")
-    print(f"Successes: {result.testsRun - len(result.failures) - len(result.errors)}")
+    print(f"Successes: {result.testsRun - len(result.failures) - len(result.errors) - len(result.skipped)}")
     print(f"Failures: {len(result.failures)}")
     print(f"Errors: {len(result.errors)}")
+    print(f"Skipped: {len(result.skipped)}")
     print("=" * 70)
     
     return result.wasSuccessful()